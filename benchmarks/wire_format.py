@@ -0,0 +1,128 @@
+"""Compare response sizes and parse times for the wire formats the frontend
+accepts.
+
+Run from the repository root:
+
+    python benchmarks/wire_format.py
+
+zstd is measured with the same module urllib3 decodes responses with
+(compression.zstd, or backports.zstd from urllib3[zstd] before Python 3.14).
+Formats whose packages (orjson, msgpack, zstd) are not installed are skipped.
+"""
+
+import base64
+import gzip
+import json
+import os
+import random
+import sys
+import timeit
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    if sys.version_info >= (3, 14):
+        from compression import zstd
+    else:
+        from backports import zstd
+except ImportError:
+    zstd = None
+
+NUMBER = 200
+
+
+def rag_payload(random_gen):
+    # A knowledge base answer with a long list of sources
+    words = ["LEWAS", "watershed", "sensor", "turbidity", "stormwater", "Webb"]
+    return {
+        "query_id": "3f1c2a9e-8b7d-4c11-9e55-0f6a2b7d9c10",
+        "create_time": 1760000000,
+        "answer_text": " ".join(random_gen.choice(words) for _ in range(400)),
+        "sources": [
+            f"* LEWAS paper {i} section {random_gen.randint(1, 20)} - "
+            f"https://lewasenge.s4.es.cloud.vt.edu/papers/{i}.pdf"
+            for i in range(40)
+        ],
+    }
+
+
+def visualization_payload(random_gen):
+    # A chart answer with an embedded PNG and the plotted readings
+    image = base64.b64encode(os.urandom(60_000)).decode("ascii")
+    return {
+        "query_id": "9a8b7c6d-5e4f-4a3b-8c2d-1e0f9a8b7c6d",
+        "create_time": 1760000000,
+        "answer_text": f'<img src="data:image/png;base64,{image}"/>',
+        "readings": [
+            {"timestamp": 1760000000 + 60 * i, "value": random_gen.uniform(6.5, 8.5)}
+            for i in range(1440)
+        ],
+        "sources": [],
+    }
+
+
+def encodings(payload):
+    json_body = json.dumps(payload).encode("utf-8")
+    bodies = {"json": (json_body, json.loads)}
+    if orjson is not None:
+        bodies["json (orjson)"] = (json_body, orjson.loads)
+    bodies["json + gzip"] = (
+        gzip.compress(json_body),
+        lambda data: loads(gzip.decompress(data)),
+    )
+    if zstd is not None:
+        bodies["json + zstd"] = (
+            zstd.compress(json_body),
+            lambda data: loads(zstd.decompress(data)),
+        )
+    if msgpack is not None:
+        msgpack_body = msgpack.packb(payload)
+        bodies["msgpack"] = (msgpack_body, msgpack.unpackb)
+        bodies["msgpack + gzip"] = (
+            gzip.compress(msgpack_body),
+            lambda data: msgpack.unpackb(gzip.decompress(data)),
+        )
+        if zstd is not None:
+            bodies["msgpack + zstd"] = (
+                zstd.compress(msgpack_body),
+                lambda data: msgpack.unpackb(zstd.decompress(data)),
+            )
+    return bodies
+
+
+def loads(data):
+    # The same fallback the frontend uses
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def main():
+    random_gen = random.Random(0)
+    payloads = {
+        "RAG answer": rag_payload(random_gen),
+        "Visualization answer": visualization_payload(random_gen),
+    }
+    for name, payload in payloads.items():
+        bodies = encodings(payload)
+        json_size = len(bodies["json"][0])
+        print(f"\n{name}")
+        print(f"{'format':<16} {'bytes':>10} {'vs json':>8} {'parse (us)':>11}")
+        for format_name, (body, parse) in bodies.items():
+            seconds = timeit.timeit(lambda: parse(body), number=NUMBER) / NUMBER
+            print(
+                f"{format_name:<16} {len(body):>10} "
+                f"{len(body) / json_size:>7.0%} {seconds * 1e6:>11.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
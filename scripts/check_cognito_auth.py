@@ -0,0 +1,161 @@
+"""Exercise the Cognito token verification and session renewal in src/auth.py
+against moto's Cognito, without an AWS account.
+
+Run from the repository root (needs `pip install "moto[cognitoidp]"`):
+
+    python scripts/check_cognito_auth.py
+
+Each check prints "ok" or raises an AssertionError.
+"""
+
+import os
+import sys
+import time
+
+import boto3
+import jwt
+from moto import mock_aws
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+from auth import TOKEN_REFRESH_MARGIN, CognitoSession, CognitoTokenVerifier
+
+REGION = "us-east-1"
+USERNAME = "student@vt.edu"
+PASSWORD = "Waterqual1ty!"
+
+
+class CountingClient:
+    # Wraps the Cognito client to count the calls a session makes
+    def __init__(self, client):
+        self.client = client
+        self.initiate_auth_calls = 0
+
+    def initiate_auth(self, **kwargs):
+        self.initiate_auth_calls += 1
+        return self.client.initiate_auth(**kwargs)
+
+
+def create_user_pool(client):
+    pool_id = client.create_user_pool(PoolName="lewas-chatbot")["UserPool"]["Id"]
+    client_ids = [
+        client.create_user_pool_client(
+            UserPoolId=pool_id,
+            ClientName=name,
+            ExplicitAuthFlows=["ALLOW_USER_PASSWORD_AUTH", "ALLOW_REFRESH_TOKEN_AUTH"],
+        )["UserPoolClient"]["ClientId"]
+        for name in ["chatbot", "other-app"]
+    ]
+    client.admin_create_user(
+        UserPoolId=pool_id,
+        Username=USERNAME,
+        TemporaryPassword="Temporary1!",
+        MessageAction="SUPPRESS",
+    )
+    client.admin_set_user_password(
+        UserPoolId=pool_id, Username=USERNAME, Password=PASSWORD, Permanent=True
+    )
+    return pool_id, client_ids
+
+
+def log_in(client, client_id):
+    response = client.initiate_auth(
+        ClientId=client_id,
+        AuthFlow="USER_PASSWORD_AUTH",
+        AuthParameters={"USERNAME": USERNAME, "PASSWORD": PASSWORD},
+    )
+    return response["AuthenticationResult"]
+
+
+def expect_invalid(verifier, token, token_use):
+    try:
+        verifier.verify(token, token_use)
+    except jwt.InvalidTokenError:
+        return
+    raise AssertionError(f"{token_use} token was accepted")
+
+
+def wait_for_refresh(session):
+    deadline = time.monotonic() + 10
+    while session._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def check_verifier(verifier, auth_result, other_auth_result):
+    claims = verifier.verify(auth_result["IdToken"], "id")
+    assert claims["cognito:username"] == USERNAME
+    verifier.verify(auth_result["AccessToken"], "access")
+    print("ok    tokens of the app client are accepted")
+
+    expect_invalid(verifier, auth_result["IdToken"], "access")
+    expect_invalid(verifier, auth_result["AccessToken"], "id")
+    print("ok    an id token is not accepted as an access token, or the reverse")
+
+    expect_invalid(verifier, other_auth_result["IdToken"], "id")
+    expect_invalid(verifier, other_auth_result["AccessToken"], "access")
+    print("ok    tokens issued to another app client are rejected")
+
+    header, payload, signature = auth_result["IdToken"].split(".")
+    tampered = ".".join([header, payload, signature[::-1]])
+    expect_invalid(verifier, tampered, "id")
+    print("ok    a token with a bad signature is rejected")
+
+
+def check_session(client, client_id, verifier, auth_result):
+    counting_client = CountingClient(client)
+    session = CognitoSession(counting_client, client_id, verifier, auth_result)
+    assert session.is_valid() and session.username == USERNAME
+
+    session.refresh_if_expiring()
+    wait_for_refresh(session)
+    assert counting_client.initiate_auth_calls == 0
+    print("ok    fresh tokens are not renewed")
+
+    session.expires_at = time.time() + TOKEN_REFRESH_MARGIN / 2
+    session.refresh_if_expiring()
+    session.refresh_if_expiring()
+    wait_for_refresh(session)
+    assert counting_client.initiate_auth_calls == 1
+    assert session.expires_at > time.time() + TOKEN_REFRESH_MARGIN
+    print("ok    tokens close to expiring are renewed once")
+
+    session.expires_at = time.time() + TOKEN_REFRESH_MARGIN / 2
+    session.close()
+    session.refresh_if_expiring()
+    wait_for_refresh(session)
+    assert counting_client.initiate_auth_calls == 1 and not session.is_valid()
+    print("ok    a closed session is not renewed")
+
+    session.refresh_if_expired()
+    assert counting_client.initiate_auth_calls == 1
+    print("ok    a closed session is not renewed once expired either")
+
+    session = CognitoSession(counting_client, client_id, verifier, auth_result)
+    session.expires_at = time.time() - 1
+    assert not session.is_valid()
+    session.refresh_if_expired()
+    assert counting_client.initiate_auth_calls == 2 and session.is_valid()
+    print("ok    an expired session is renewed before it is used")
+
+    session.expires_at = time.time() - 1
+    session.refresh_token = "revoked"
+    session.refresh_if_expired()
+    session.refresh_if_expired()
+    assert counting_client.initiate_auth_calls == 3 and not session.is_valid()
+    print("ok    a session that cannot be renewed is closed and not retried")
+
+
+def main():
+    with mock_aws():
+        client = boto3.client("cognito-idp", region_name=REGION)
+        pool_id, (client_id, other_client_id) = create_user_pool(client)
+        verifier = CognitoTokenVerifier(REGION, pool_id, client_id)
+        auth_result = log_in(client, client_id)
+        check_verifier(verifier, auth_result, log_in(client, other_client_id))
+        check_session(client, client_id, verifier, auth_result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""Export queries and feedback from the lewas-chatbot-queries table and
+summarize them.
+
+    python src/analytics.py --output analytics
+
+The table is read with a parallel segmented scan and each segment streams its
+rows to its own Parquet (or CSV) files, so memory use stays flat however big
+the table is. The exported files are then aggregated with pyarrow: like rate
+per query type, latency percentiles and the most asked questions. The most
+asked questions are also written to top_questions.json, which the frontend
+uses to prefill its caches.
+
+Each item is expected to look like the ones the backends write:
+
+    query_id        string, the partition key
+    query_text      string, the question as typed
+    classification  string, "RAG" or a live data / visualization type (older
+                    items name this attribute query_type)
+    answer_text     string
+    sources         list of strings, the documents the answer cites (kept as
+                    a JSON string in the export, which CSV can hold)
+    create_time     number, Unix seconds
+    latency_ms      number, time taken to answer
+    user_liked      boolean, set by the chat page's feedback buttons
+    served_from_cache
+                    boolean, true on the items the chat page logs itself for
+                    answers it served from its cache
+
+Missing attributes are read as nulls, and a column that is null in every row is
+reported when summarizing, since it usually means the backends store that
+attribute under another name.
+
+AWS credentials are taken from the usual boto3 sources (environment, profile
+or instance role).
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import boto3
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+DEFAULT_TABLE_NAME = "lewas-chatbot-queries"
+DEFAULT_SEGMENTS = 8
+DEFAULT_CHUNK_ROWS = 10000
+DEFAULT_TOP = 50
+LATENCY_PERCENTILES = [0.5, 0.9, 0.95, 0.99]
+
+SCHEMA = pa.schema(
+    [
+        ("query_id", pa.string()),
+        ("query_text", pa.string()),
+        ("classification", pa.string()),
+        ("answer_text", pa.string()),
+        ("sources", pa.string()),
+        ("create_time", pa.float64()),
+        ("latency_ms", pa.float64()),
+        ("user_liked", pa.bool_()),
+        ("served_from_cache", pa.bool_()),
+    ]
+)
+
+
+def to_row(item):
+    def number(value):
+        return float(value) if isinstance(value, (Decimal, int, float)) else None
+
+    liked = item.get("user_liked")
+    sources = item.get("sources")
+    return {
+        "query_id": item.get("query_id"),
+        "query_text": item.get("query_text"),
+        # Older items store the classification as query_type
+        "classification": item.get("classification") or item.get("query_type"),
+        "answer_text": item.get("answer_text"),
+        "sources": (
+            json.dumps(list(sources)) if isinstance(sources, (list, set)) else None
+        ),
+        "create_time": number(item.get("create_time")),
+        "latency_ms": number(item.get("latency_ms")),
+        "user_liked": liked if isinstance(liked, bool) else None,
+        "served_from_cache": item.get("served_from_cache") is True,
+    }
+
+
+class ChunkWriter:
+    # Writes rows to numbered files of at most `chunk_rows` rows each
+    def __init__(self, output_dir, prefix, file_format, chunk_rows):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.file_format = file_format
+        self.chunk_rows = chunk_rows
+        self.rows = []
+        self.chunks = 0
+        self.total = 0
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        table = pa.Table.from_pylist(self.rows, schema=SCHEMA)
+        path = os.path.join(
+            self.output_dir, f"{self.prefix}-{self.chunks:05d}.{self.file_format}"
+        )
+        if self.file_format == "parquet":
+            pq.write_table(table, path, compression="zstd")
+        else:
+            pyarrow.csv.write_csv(table, path)
+        self.total += len(self.rows)
+        self.chunks += 1
+        self.rows = []
+
+
+def scan_segment(table_name, region, segment, total_segments, writer):
+    # boto3 resources are not thread-safe, so every segment gets its own
+    table = boto3.session.Session().resource("dynamodb", region_name=region)
+    table = table.Table(table_name)
+    scan_kwargs = {"Segment": segment, "TotalSegments": total_segments}
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get("Items", []):
+            writer.add(to_row(item))
+        if "LastEvaluatedKey" not in response:
+            break
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    writer.flush()
+    return writer.total
+
+
+def export_table(
+    table_name,
+    region,
+    output_dir,
+    file_format="parquet",
+    segments=DEFAULT_SEGMENTS,
+    chunk_rows=DEFAULT_CHUNK_ROWS,
+):
+    data_dir = os.path.join(output_dir, "queries")
+    os.makedirs(data_dir, exist_ok=True)
+    # Remove the files of an earlier export so they are not counted twice
+    for name in os.listdir(data_dir):
+        if name.startswith("part-"):
+            os.remove(os.path.join(data_dir, name))
+
+    with ThreadPoolExecutor(max_workers=segments) as executor:
+        futures = [
+            executor.submit(
+                scan_segment,
+                table_name,
+                region,
+                segment,
+                segments,
+                ChunkWriter(data_dir, f"part-{segment:03d}", file_format, chunk_rows),
+            )
+            for segment in range(segments)
+        ]
+        return sum(future.result() for future in futures)
+
+
+def load_export(output_dir, file_format="parquet"):
+    data_dir = os.path.join(output_dir, "queries")
+    if file_format == "csv":
+        file_format = ds.CsvFileFormat(
+            convert_options=pyarrow.csv.ConvertOptions(column_types=SCHEMA)
+        )
+    return ds.dataset(data_dir, schema=SCHEMA, format=file_format).to_table()
+
+
+def normalize_prompts(column):
+    column = pc.utf8_lower(pc.utf8_trim_whitespace(column))
+    column = pc.replace_substring_regex(column, pattern=r"\s+", replacement=" ")
+    return pc.replace_substring_regex(column, pattern=r"[?.!]+$", replacement="")
+
+
+def like_rate_by_classification(table):
+    grouped = (
+        pa.table(
+            {
+                "classification": pc.fill_null(table["classification"], "UNKNOWN"),
+                "liked": pc.cast(table["user_liked"], pa.int8()),
+            }
+        )
+        .group_by("classification")
+        .aggregate([([], "count_all"), ("liked", "count"), ("liked", "mean")])
+        .sort_by("classification")
+    )
+    return [
+        {
+            "classification": row["classification"],
+            "queries": row["count_all"],
+            "rated": row["liked_count"],
+            "like_rate": row["liked_mean"],
+        }
+        for row in grouped.to_pylist()
+    ]
+
+
+def latency_percentiles(table):
+    latency = table["latency_ms"]
+    if latency.null_count == len(latency):
+        return {}
+    values = pc.quantile(latency, q=LATENCY_PERCENTILES).to_pylist()
+    return {
+        f"p{round(q * 100)}": value for q, value in zip(LATENCY_PERCENTILES, values)
+    }
+
+
+def top_questions(table, top=DEFAULT_TOP):
+    prompts = pa.table(
+        {
+            "prompt": normalize_prompts(table["query_text"]),
+            "query_id": table["query_id"],
+            "classification": table["classification"],
+            "query_text": table["query_text"],
+            "answer_text": table["answer_text"],
+            "sources": table["sources"],
+            "create_time": table["create_time"],
+            "user_liked": table["user_liked"],
+        }
+    ).filter(pc.invert(pc.is_null(pc.field("prompt"))))
+
+    counts = (
+        prompts.group_by("prompt")
+        .aggregate([("prompt", "count")])
+        .sort_by([("prompt_count", "descending")])
+        .slice(0, top)
+    )
+    top_rows = prompts.filter(pc.is_in(prompts["prompt"], counts["prompt"]))
+    # Newest rows first, so the first row seen for a prompt is its latest answer
+    rows_by_prompt = {}
+    for row in top_rows.sort_by([("create_time", "descending")]).to_pylist():
+        rows_by_prompt.setdefault(row["prompt"], []).append(row)
+
+    questions = []
+    for prompt, count in zip(
+        counts["prompt"].to_pylist(), counts["prompt_count"].to_pylist()
+    ):
+        rows = rows_by_prompt[prompt]
+        classifications = [
+            row["classification"] for row in rows if row["classification"]
+        ]
+        classification = (
+            max(set(classifications), key=classifications.count)
+            if classifications
+            else None
+        )
+        question = {
+            "query_text": rows[0]["query_text"].strip(),
+            "count": count,
+            "classification": classification,
+        }
+        # Only knowledge base answers stay valid; live data and charts change
+        if classification == "RAG":
+            answer = next(
+                (
+                    row
+                    for row in rows
+                    if row["classification"] == "RAG"
+                    and row["answer_text"]
+                    and row["user_liked"] is not False
+                ),
+                None,
+            )
+            if answer is not None:
+                question["answer_text"] = answer["answer_text"]
+                question["query_id"] = answer["query_id"]
+                question["create_time"] = answer["create_time"]
+                question["sources"] = json.loads(answer["sources"] or "[]")
+        questions.append(question)
+    return questions
+
+
+def warn_empty_columns(table):
+    if table.num_rows == 0:
+        return
+    for name in table.column_names:
+        if table[name].null_count == table.num_rows:
+            print(
+                f"Warning: {name} is empty in all {table.num_rows} rows; "
+                "see the expected item schema at the top of src/analytics.py"
+            )
+
+
+def summarize(output_dir, file_format="parquet", top=DEFAULT_TOP):
+    table = load_export(output_dir, file_format)
+    warn_empty_columns(table)
+    summary = {
+        "queries": table.num_rows,
+        "like_rate_by_classification": like_rate_by_classification(table),
+        "latency_ms": latency_percentiles(table),
+    }
+    questions = top_questions(table, top)
+    summary["top_questions"] = [
+        {"query_text": question["query_text"], "count": question["count"]}
+        for question in questions
+    ]
+
+    with open(os.path.join(output_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    with open(os.path.join(output_dir, "top_questions.json"), "w") as f:
+        json.dump(questions, f, indent=2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--table", default=DEFAULT_TABLE_NAME)
+    parser.add_argument(
+        "--region",
+        default=os.environ.get("AWS_REGION") or os.environ.get("AWS_DEFAULT_REGION"),
+    )
+    parser.add_argument("--output", default="analytics")
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet")
+    parser.add_argument("--segments", type=int, default=DEFAULT_SEGMENTS)
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP)
+    parser.add_argument(
+        "--skip-export",
+        action="store_true",
+        help="Summarize the files of an earlier export without scanning the table",
+    )
+    args = parser.parse_args()
+
+    if not args.skip_export:
+        rows = export_table(
+            args.table,
+            args.region,
+            args.output,
+            file_format=args.format,
+            segments=args.segments,
+            chunk_rows=args.chunk_rows,
+        )
+        print(f"Exported {rows} rows to {os.path.join(args.output, 'queries')}")
+
+    summary = summarize(args.output, file_format=args.format, top=args.top)
+    print(f"\nQueries: {summary['queries']}")
+    print("\nLike rate by query type")
+    for row in summary["like_rate_by_classification"]:
+        like_rate = "n/a" if row["like_rate"] is None else f"{row['like_rate']:.0%}"
+        print(
+            f"  {row['classification']:<16} {like_rate:>5} "
+            f"({row['rated']} rated of {row['queries']})"
+        )
+    if summary["latency_ms"]:
+        print("\nLatency (ms)")
+        for name, value in summary["latency_ms"].items():
+            print(f"  {name}: {value:.0f}")
+    print("\nMost asked questions")
+    for question in summary["top_questions"][:10]:
+        print(f"  {question['count']:>5}  {question['query_text']}")
+
+
+if __name__ == "__main__":
+    main()
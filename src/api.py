@@ -0,0 +1,81 @@
+import json
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Faster JSON parsing and the compact MessagePack encoding are used when the
+# packages are installed, and plain JSON otherwise
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_CONTENT_TYPES = (
+    "application/msgpack",
+    "application/x-msgpack",
+    "application/vnd.msgpack",
+)
+
+# One pooled session per server process, so connections to the backends are
+# reused across reruns and user sessions
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+
+
+class NoCookiesPolicy(DefaultCookiePolicy):
+    # The session is shared by every user, so a cookie set by a backend for one
+    # request must never be sent with another user's
+    def set_ok(self, cookie, request):
+        return False
+
+
+session.cookies.set_policy(NoCookiesPolicy())
+
+
+def request_headers(api_key):
+    # Ask for MessagePack when we can decode it, falling back to JSON.
+    # Compression needs nothing here: requests already sends an Accept-Encoding
+    # listing every codec urllib3 can undo (zstd comes from urllib3[zstd]).
+    if msgpack is not None:
+        accept = "application/msgpack, application/json;q=0.9"
+    else:
+        accept = "application/json"
+    return {
+        "accept": accept,
+        "Content-Type": "application/json",
+        "API-Key": api_key,
+    }
+
+
+def post_query(url, payload, api_key, timeout):
+    return session.post(
+        url, json=payload, headers=request_headers(api_key), timeout=timeout
+    )
+
+
+def loads_json(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def decode_response(response):
+    # Parses a (already decompressed) response body according to its
+    # Content-Type. Raises ValueError if the body cannot be decoded.
+    content_type = response.headers.get("Content-Type", "")
+    content_type = content_type.split(";")[0].strip().lower()
+    if content_type in MSGPACK_CONTENT_TYPES:
+        if msgpack is None:
+            raise ValueError("Received MessagePack but msgpack is not installed")
+        try:
+            return msgpack.unpackb(response.content, raw=False)
+        except Exception as e:
+            raise ValueError(f"Invalid MessagePack response: {e}") from e
+    return loads_json(response.content)
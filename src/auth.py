@@ -0,0 +1,232 @@
+import threading
+import time
+
+import boto3
+import jwt
+import requests
+import streamlit as st
+
+# How long fetched Cognito signing keys are used before being refreshed
+JWKS_REFRESH_INTERVAL = 3600
+# Minimum time between refetches triggered by an unknown key id
+JWKS_MIN_REFETCH_INTERVAL = 60
+# Renew tokens this many seconds before they expire
+TOKEN_REFRESH_MARGIN = 300
+
+
+class JWKSCache:
+    # Signing keys for a user pool, fetched once and then refreshed in the
+    # background when stale, so verifying a token never waits on the network
+    # except for the very first fetch or a key rotation
+    def __init__(self, jwks_url, refresh_interval=JWKS_REFRESH_INTERVAL):
+        self.jwks_url = jwks_url
+        self.refresh_interval = refresh_interval
+        self._keys = {}
+        self._fetched_at = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def refresh(self):
+        response = requests.get(self.jwks_url, timeout=10)
+        response.raise_for_status()
+        keys = {jwk["kid"]: jwt.PyJWK(jwk) for jwk in response.json()["keys"]}
+        with self._lock:
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                # Keep using the cached keys until the next attempt
+                print(f"JWKS refresh error: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def get_key(self, kid):
+        if self._fetched_at is None:
+            self.refresh()
+
+        age = time.monotonic() - self._fetched_at
+        key = self._keys.get(kid)
+        if key is None and age > JWKS_MIN_REFETCH_INTERVAL:
+            # The pool may have rotated its keys
+            self.refresh()
+            key = self._keys.get(kid)
+        elif age > self.refresh_interval:
+            self._refresh_in_background()
+        return key
+
+
+class CognitoTokenVerifier:
+    def __init__(self, region, user_pool_id, client_id, jwks_url=None):
+        self.issuer = f"https://cognito-idp.{region}.amazonaws.com/{user_pool_id}"
+        self.client_id = client_id
+        self.jwks = JWKSCache(jwks_url or f"{self.issuer}/.well-known/jwks.json")
+
+    def verify(self, token, token_use):
+        # Checks the signature, expiry, issuer and audience of an "id" or
+        # "access" token and returns its claims
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = self.jwks.get_key(kid)
+        if key is None:
+            raise jwt.InvalidTokenError(f"Unknown signing key: {kid}")
+
+        claims = jwt.decode(
+            token,
+            key.key,
+            algorithms=["RS256"],
+            issuer=self.issuer,
+            audience=self.client_id if token_use == "id" else None,
+            options={
+                "verify_aud": token_use == "id",
+                "require": ["exp", "iat", "token_use"],
+            },
+        )
+        if claims["token_use"] != token_use:
+            raise jwt.InvalidTokenError(f"Expected an {token_use} token")
+        if token_use == "access" and claims.get("client_id") != self.client_id:
+            raise jwt.InvalidTokenError("Token was issued to a different client")
+        return claims
+
+
+class CognitoSession:
+    # Tokens of one logged-in user. They are verified locally when issued, so
+    # checking the session on each rerun is just a clock comparison. Shortly
+    # before they expire, the next rerun renews them with the refresh token in
+    # the background, and a rerun after they expired renews them before going
+    # on. A session nobody uses makes no calls to Cognito.
+    def __init__(self, client, client_id, verifier, auth_result):
+        self.client = client
+        self.client_id = client_id
+        self.verifier = verifier
+        self.refresh_token = auth_result["RefreshToken"]
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._closed = False
+        self._set_tokens(auth_result)
+
+    def _set_tokens(self, auth_result):
+        claims = self.verifier.verify(auth_result["IdToken"], "id")
+        access_claims = self.verifier.verify(auth_result["AccessToken"], "access")
+        with self._lock:
+            self.id_token = auth_result["IdToken"]
+            self.access_token = auth_result["AccessToken"]
+            self.claims = claims
+            self.expires_at = min(claims["exp"], access_claims["exp"])
+
+    def refresh(self):
+        response = self.client.initiate_auth(
+            ClientId=self.client_id,
+            AuthFlow="REFRESH_TOKEN_AUTH",
+            AuthParameters={"REFRESH_TOKEN": self.refresh_token},
+        )
+        self._set_tokens(response["AuthenticationResult"])
+
+    def refresh_if_expiring(self):
+        # Starts one background renewal once the tokens are within
+        # TOKEN_REFRESH_MARGIN of expiring
+        with self._lock:
+            if (
+                self._closed
+                or self._refreshing
+                or time.time() < self.expires_at - TOKEN_REFRESH_MARGIN
+            ):
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                # The session ends when the current tokens expire
+                print(f"Token refresh error: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def refresh_if_expired(self):
+        # The tokens can expire between two reruns, but the refresh token lasts
+        # for days, so renew them now rather than log the user out. A session
+        # that cannot be renewed is closed so this is not retried every rerun.
+        if self._closed or time.time() < self.expires_at:
+            return
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Token refresh error: {str(e)}")
+            self.close()
+
+    @property
+    def username(self):
+        return self.claims.get("email") or self.claims.get("cognito:username")
+
+    def is_valid(self):
+        return not self._closed and time.time() < self.expires_at
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+
+
+@st.cache_resource
+def get_cognito_client():
+    return boto3.client(
+        "cognito-idp",
+        region_name=st.secrets["COGNITO_REGION"],
+        endpoint_url=st.secrets.get("COGNITO_ENDPOINT_URL") or None,
+    )
+
+
+@st.cache_resource
+def get_token_verifier():
+    # Shared by all sessions so the signing keys are fetched once per process
+    return CognitoTokenVerifier(
+        st.secrets["COGNITO_REGION"],
+        st.secrets["COGNITO_USER_POOL_ID"],
+        st.secrets["COGNITO_CLIENT_ID"],
+        jwks_url=st.secrets.get("COGNITO_JWKS_URL") or None,
+    )
+
+
+def start_session(auth_result):
+    st.session_state.cognito_session = CognitoSession(
+        get_cognito_client(),
+        st.secrets["COGNITO_CLIENT_ID"],
+        get_token_verifier(),
+        auth_result,
+    )
+    st.session_state.authenticated = True
+
+
+def is_logged_in():
+    session = st.session_state.get("cognito_session")
+    if session is not None:
+        session.refresh_if_expired()
+    st.session_state.authenticated = session is not None and session.is_valid()
+    if st.session_state.authenticated:
+        session.refresh_if_expiring()
+    return st.session_state.authenticated
+
+
+def log_out():
+    session = st.session_state.get("cognito_session")
+    if session is not None:
+        session.close()
+    # Drop everything this user left in the session, such as their open
+    # conversation, so none of it carries over to the next user of this browser
+    st.session_state.clear()
+    st.query_params.clear()
+    st.session_state.cognito_session = None
+    st.session_state.authenticated = False
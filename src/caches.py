@@ -0,0 +1,63 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Classifications rarely change; knowledge base answers may be updated when new
+# documents are added
+CLASSIFICATION_TTL = 24 * 3600
+ANSWER_TTL = 6 * 3600
+MAX_ENTRIES = 1024
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION_RE = re.compile(r"[?.!]+$")
+
+
+def question_key(prompt):
+    # Same normalization as analytics.normalize_prompts, so questions from the
+    # analytics export match what users type
+    key = _WHITESPACE_RE.sub(" ", prompt.strip().lower())
+    return _TRAILING_PUNCTUATION_RE.sub("", key)
+
+
+class TTLCache:
+    # A small thread-safe LRU cache whose entries expire after `ttl` seconds.
+    # A key of None is never cached, so callers can pass None for questions
+    # that depend on conversation context.
+    def __init__(self, ttl, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if time.monotonic() > expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if key is None:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Shared by all sessions in this server process. Only knowledge base (RAG)
+# answers are cached; live data and visualizations must always be fetched.
+classification_cache = TTLCache(CLASSIFICATION_TTL)
+answer_cache = TTLCache(ANSWER_TTL)
@@ -0,0 +1,96 @@
+import html
+import json
+import re
+
+# Byte budget for the recent turns sent with each query (roughly four bytes of
+# English text per model token)
+DEFAULT_CONTEXT_BUDGET = 2000
+# Longest a single turn may be once compacted
+MAX_TURN_CHARS = 600
+# Longest the summary of older turns may grow, and how much of each older
+# question it keeps
+MAX_SUMMARY_CHARS = 800
+SUMMARY_QUESTION_CHARS = 120
+
+_MARKDOWN_IMAGE_RE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_DATA_URI_RE = re.compile(r"data:[\w/+.-]+;base64,[A-Za-z0-9+/=]+")
+_TAG_RE = re.compile(r"<[^>]*>")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def compact_text(text, limit=MAX_TURN_CHARS):
+    # Drop embedded images and HTML markup (charts, source lists) and collapse
+    # whitespace, keeping only the readable text of a message
+    text = _MARKDOWN_IMAGE_RE.sub(" ", text)
+    text = _DATA_URI_RE.sub(" ", text)
+    text = _TAG_RE.sub(" ", text)
+    text = html.unescape(text)
+    text = _WHITESPACE_RE.sub(" ", text).strip()
+    if len(text) > limit:
+        text = text[: limit - 1].rstrip() + "…"
+    return text
+
+
+def payload_size(payload):
+    # Size of the JSON body requests sends for `json=payload`
+    return len(json.dumps(payload).encode("utf-8"))
+
+
+class ConversationContext:
+    # Builds the context sent with a follow-up question: the most recent turns
+    # that fit in the byte budget, plus a short summary of the older questions.
+    # Each older turn is summarized once as it falls out of the window and the
+    # summary is kept here, so building the context costs the same however long
+    # the conversation gets.
+    def __init__(self, budget=DEFAULT_CONTEXT_BUDGET):
+        self.budget = budget
+        self.summary = ""
+        self.summarized_upto = 0
+
+    def build(self, messages):
+        # `messages` are the turns before the current question, each carrying
+        # its "turn" number in the whole conversation
+        recent = []
+        used = 0
+        window_start = len(messages)
+        for i in range(len(messages) - 1, -1, -1):
+            turn = {
+                "role": messages[i]["role"],
+                "content": compact_text(messages[i]["content"]),
+            }
+            size = payload_size(turn)
+            if used + size > self.budget:
+                break
+            recent.append(turn)
+            used += size
+            window_start = i
+        recent.reverse()
+
+        self._summarize(messages, window_start)
+
+        context = {"recent_turns": recent}
+        if self.summary:
+            context["summary"] = f"Earlier questions: {self.summary}"
+        return context
+
+    def _summarize(self, messages, window_start):
+        # Summarizes messages[:window_start] that are not in the summary yet.
+        # Turn numbers may have gaps, so those are found by their turn number
+        # rather than by position, walking back only over the new ones.
+        start = window_start
+        while start > 0 and messages[start - 1]["turn"] >= self.summarized_upto:
+            start -= 1
+        if start == window_start:
+            return
+
+        questions = [
+            compact_text(messages[i]["content"], SUMMARY_QUESTION_CHARS)
+            for i in range(start, window_start)
+            if messages[i]["role"] == "user"
+        ]
+        summary = "; ".join(part for part in [self.summary] + questions if part)
+        if len(summary) > MAX_SUMMARY_CHARS:
+            # Keep the most recent of the older questions
+            summary = "…" + summary[-(MAX_SUMMARY_CHARS - 1) :]
+        self.summary = summary
+        self.summarized_upto = messages[window_start - 1]["turn"] + 1
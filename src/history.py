@@ -0,0 +1,167 @@
+import json
+import sqlite3
+import threading
+import time
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+# Number of messages loaded per page when resuming a conversation
+DEFAULT_PAGE_SIZE = 20
+
+
+# Conversation turns are stored append-only, one record per chat message,
+# keyed by (conversation_id, turn) where turn is the message's position in the
+# conversation. Pages are read newest-first through the key so that resuming a
+# conversation costs the same no matter how long it is.
+class SQLiteConversationStore:
+    def __init__(self, path):
+        self.path = path
+        # Streamlit runs each session in its own thread, so share one
+        # connection and serialize access to it
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS conversation_turns (
+                    conversation_id TEXT NOT NULL,
+                    turn INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    details TEXT,
+                    feedback TEXT,
+                    create_time REAL NOT NULL,
+                    PRIMARY KEY (conversation_id, turn)
+                ) WITHOUT ROWID
+                """
+            )
+
+    def append_turn(self, conversation_id, turn, role, content, details=None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO conversation_turns "
+                "(conversation_id, turn, role, content, details, create_time) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    conversation_id,
+                    turn,
+                    role,
+                    content,
+                    json.dumps(details) if details is not None else None,
+                    time.time(),
+                ),
+            )
+
+    def set_feedback(self, conversation_id, turn, feedback):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE conversation_turns SET feedback = ? "
+                "WHERE conversation_id = ? AND turn = ?",
+                (feedback, conversation_id, turn),
+            )
+
+    def load_page(self, conversation_id, before=None, limit=DEFAULT_PAGE_SIZE):
+        # Returns up to `limit` turns older than `before` (or the newest turns
+        # when `before` is None), in chronological order
+        query = (
+            "SELECT turn, role, content, details, feedback FROM conversation_turns "
+            "WHERE conversation_id = ?"
+        )
+        params = [conversation_id]
+        if before is not None:
+            query += " AND turn < ?"
+            params.append(before)
+        query += " ORDER BY turn DESC LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        return [
+            {
+                "turn": turn,
+                "role": role,
+                "content": content,
+                "details": json.loads(details) if details is not None else None,
+                "feedback": feedback,
+            }
+            for turn, role, content, details, feedback in reversed(rows)
+        ]
+
+
+class DynamoDBConversationStore:
+    # Expects a table with partition key `conversation_id` (S) and sort key
+    # `turn` (N). Uses a low-level client, which unlike a boto3 resource is
+    # safe to share between session threads.
+    def __init__(self, client, table_name):
+        self.client = client
+        self.table_name = table_name
+        self._serializer = TypeSerializer()
+        self._deserializer = TypeDeserializer()
+
+    def _serialize(self, values):
+        return {name: self._serializer.serialize(v) for name, v in values.items()}
+
+    def _deserialize(self, item):
+        return {name: self._deserializer.deserialize(v) for name, v in item.items()}
+
+    def append_turn(self, conversation_id, turn, role, content, details=None):
+        item = {
+            "conversation_id": conversation_id,
+            "turn": turn,
+            "role": role,
+            "content": content,
+            "create_time": int(time.time()),
+        }
+        if details is not None:
+            item["details"] = details
+        # Never overwrite an existing turn
+        self.client.put_item(
+            TableName=self.table_name,
+            Item=self._serialize(item),
+            ConditionExpression="attribute_not_exists(turn)",
+        )
+
+    def set_feedback(self, conversation_id, turn, feedback):
+        # Like the SQLite UPDATE, a turn that was never saved is left alone
+        # rather than created without its role and content
+        try:
+            self.client.update_item(
+                TableName=self.table_name,
+                Key=self._serialize({"conversation_id": conversation_id, "turn": turn}),
+                UpdateExpression="set feedback = :fb",
+                ConditionExpression="attribute_exists(turn)",
+                ExpressionAttributeValues=self._serialize({":fb": feedback}),
+            )
+        except self.client.exceptions.ConditionalCheckFailedException:
+            pass
+
+    def load_page(self, conversation_id, before=None, limit=DEFAULT_PAGE_SIZE):
+        condition = "conversation_id = :cid"
+        values = {":cid": conversation_id}
+        if before is not None:
+            condition += " AND turn < :before"
+            values[":before"] = before
+        response = self.client.query(
+            TableName=self.table_name,
+            KeyConditionExpression=condition,
+            ExpressionAttributeValues=self._serialize(values),
+            ScanIndexForward=False,
+            Limit=limit,
+        )
+
+        items = [self._deserialize(item) for item in response.get("Items", [])]
+        return [
+            {
+                "turn": int(item["turn"]),
+                "role": item["role"],
+                "content": item["content"],
+                "details": item.get("details"),
+                "feedback": item.get("feedback"),
+            }
+            for item in reversed(items)
+            # Skip items written outside append_turn (such as a stray feedback
+            # update) rather than failing the whole page
+            if "role" in item and "content" in item
+        ]
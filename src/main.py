@@ -1,5 +1,17 @@
 import streamlit as st
+
+import profiling
+
+# Started before importing Home so its setup is profiled too
+rerun_profile = profiling.start("Home")
+
+import warmup
+
+# Connections, static files and caches are prepared once per server process
+warmup.start()
+
 from Home import main as home_main
 
 if __name__ == "__main__":
-    home_main()
+    with rerun_profile:
+        home_main()
@@ -1,37 +1,159 @@
 import streamlit as st
+
+import profiling
+
+# Started before the rest of the page so its setup is profiled too
+rerun_profile = profiling.start("chat")
+
+import warmup
+
+# Connections, static files and caches are prepared once per server process
+warmup.start()
+
 import requests
-import json
+import time
+import uuid
 from datetime import datetime
-import boto3
-from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import TypeSerializer
+
+from api import decode_response, post_query
+from auth import is_logged_in, log_out
+from caches import answer_cache, classification_cache, question_key
+from context import DEFAULT_CONTEXT_BUDGET, ConversationContext, payload_size
+from history import (
+    DEFAULT_PAGE_SIZE,
+    DynamoDBConversationStore,
+    SQLiteConversationStore,
+)
 
 # Get API URLs and keys from secrets
 API_BASE_URL = st.secrets["API_BASE_URL"]
 API_BASE_URL_RAG = st.secrets["API_BASE_URL_RAG"]  # Separate RAG endpoint
 API_KEY = st.secrets["API_KEY"]
 API_KEY_RAG = st.secrets["API_KEY_RAG"]  # New RAG-specific API key
-AWS_ACCESS_KEY_ID = st.secrets["AWS_ACCESS_KEY_ID"]
-AWS_SECRET_ACCESS_KEY = st.secrets["AWS_SECRET_ACCESS_KEY"]
-AWS_REGION_NAME = st.secrets["AWS_REGION_NAME"]
+# Where conversation history is persisted: "sqlite" (local file) or "dynamodb"
+HISTORY_BACKEND = st.secrets.get("HISTORY_BACKEND", "sqlite")
+HISTORY_DB_PATH = st.secrets.get("HISTORY_DB_PATH", "chat_history.db")
+HISTORY_TABLE_NAME = st.secrets.get("HISTORY_TABLE_NAME", "lewas-chatbot-conversations")
+# Byte budget for the recent conversation turns sent with each query
+CONTEXT_BUDGET_BYTES = st.secrets.get("CONTEXT_BUDGET_BYTES", DEFAULT_CONTEXT_BUDGET)
+
+# Set LOGIN_ENABLED = false in secrets.toml to disable login
+LOGIN_ENABLED = st.secrets.get("LOGIN_ENABLED", False)
+
+QUERIES_TABLE_NAME = "lewas-chatbot-queries"
+
+dynamodb = warmup.get_dynamodb()
+serializer = TypeSerializer()
+
+
+@st.cache_resource
+def get_history_store():
+    # One store per server process, shared by all sessions
+    if HISTORY_BACKEND == "dynamodb":
+        return DynamoDBConversationStore(dynamodb, HISTORY_TABLE_NAME)
+    return SQLiteConversationStore(HISTORY_DB_PATH)
+
+
+def get_conversation_id():
+    # The conversation id lives in the URL so a reload (or a different replica)
+    # picks up the same conversation
+    if "conversation_id" not in st.session_state:
+        conversation_id = st.query_params.get("conversation")
+        if not conversation_id:
+            conversation_id = uuid.uuid4().hex
+            st.query_params["conversation"] = conversation_id
+        st.session_state.conversation_id = conversation_id
+    return st.session_state.conversation_id
+
+
+def start_new_conversation():
+    # Empty the chat and continue under a new conversation id; the saved
+    # history of the old one is kept
+    st.session_state.messages = []
+    st.session_state.details = {}
+    st.session_state.feedback = {}
+    st.session_state.has_earlier_history = False
+    st.session_state.history_bytes = 0
+    st.session_state.pop("conversation_context", None)
+    st.session_state.conversation_id = uuid.uuid4().hex
+    st.query_params["conversation"] = st.session_state.conversation_id
+
+
+def load_history_page(before=None):
+    # Returns None if the store could not be read, which is not the same as a
+    # conversation with no saved turns
+    try:
+        return get_history_store().load_page(
+            get_conversation_id(), before=before, limit=DEFAULT_PAGE_SIZE
+        )
+    except Exception as e:
+        print(f"History load error: {str(e)}")
+        return None
+
+
+def message_size(message):
+    # Bytes the message adds to a request that sends the whole history
+    return payload_size({"role": message["role"], "content": message["content"]})
+
+
+def add_history_turns(turns):
+    # Merge loaded turns into session state. Each message keeps the turn number
+    # it was saved with, and details and feedback are keyed by it, so older
+    # pages can be prepended (and turns that were never saved skipped) without
+    # invalidating what is already held for newer ones.
+    for turn in turns:
+        if turn["details"] is not None:
+            st.session_state.details[turn["turn"]] = turn["details"]
+        if turn["feedback"] is not None:
+            st.session_state.feedback[turn["turn"]] = turn["feedback"]
+    messages = [
+        {"turn": turn["turn"], "role": turn["role"], "content": turn["content"]}
+        for turn in turns
+    ]
+    st.session_state.history_bytes += sum(message_size(m) for m in messages)
+    st.session_state.messages = messages + st.session_state.messages
+    # A short page means the start of the conversation has been reached
+    st.session_state.has_earlier_history = len(turns) == DEFAULT_PAGE_SIZE
+
+
+def save_history_turn(message, details=None):
+    # Number the new turn after the last one held rather than by its position
+    messages = st.session_state.messages
+    turn = messages[-1]["turn"] + 1 if messages else 0
+    message["turn"] = turn
+    messages.append(message)
+    st.session_state.history_bytes += message_size(message)
+    try:
+        get_history_store().append_turn(
+            get_conversation_id(),
+            turn,
+            message["role"],
+            message["content"],
+            details=details,
+        )
+    except Exception as e:
+        # Keep chatting even if history cannot be saved
+        print(f"History save error: {str(e)}")
+    return turn
 
-LOGIN_ENABLED = False  # Set this to False to disable login
 
-dynamodb = boto3.resource(
-    "dynamodb",
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    region_name=AWS_REGION_NAME,
-)
-table = dynamodb.Table("lewas-chatbot-queries")
+def save_history_feedback(turn, feedback):
+    st.session_state.feedback[turn] = feedback
+    try:
+        get_history_store().set_feedback(get_conversation_id(), turn, feedback)
+    except Exception as e:
+        print(f"History feedback error: {str(e)}")
 
 
 def update_feedback_in_dynamodb(query_id, user_liked):
     try:
         # Try to update the existing item
-        response = table.update_item(
-            Key={"query_id": query_id},
+        response = dynamodb.update_item(
+            TableName=QUERIES_TABLE_NAME,
+            Key={"query_id": {"S": query_id}},
             UpdateExpression="set user_liked = :ul",
-            ExpressionAttributeValues={":ul": user_liked},
+            ExpressionAttributeValues={":ul": {"BOOL": user_liked}},
             ReturnValues="UPDATED_NEW",
         )
         return True
@@ -43,6 +165,58 @@ def update_feedback_in_dynamodb(query_id, user_liked):
         return False
 
 
+def log_cached_answer(prompt, classification, cached_answer):
+    # An answer served from the cache is logged as a query of its own, so it is
+    # counted by analytics and rated without touching the original's feedback
+    query_id = str(uuid.uuid4())
+    item = {
+        "query_id": query_id,
+        "query_text": prompt,
+        "classification": classification,
+        "answer_text": cached_answer.get("answer_text", ""),
+        "sources": cached_answer.get("sources", []),
+        "create_time": int(time.time()),
+        "served_from_cache": True,
+    }
+    try:
+        dynamodb.put_item(
+            TableName=QUERIES_TABLE_NAME,
+            Item={name: serializer.serialize(value) for name, value in item.items()},
+        )
+    except Exception as e:
+        print(f"Query log error: {str(e)}")
+        item["query_id"] = "N/A"
+    return item
+
+
+def build_query_payload(prompt):
+    # Send the question with a compact context of the conversation so far, and
+    # report how large the request is compared to sending the whole history
+    if "conversation_context" not in st.session_state:
+        st.session_state.conversation_context = ConversationContext(
+            CONTEXT_BUDGET_BYTES
+        )
+
+    earlier_messages = st.session_state.messages[:-1]
+    payload = {"query_text": prompt}
+    context = st.session_state.conversation_context.build(earlier_messages)
+    if context["recent_turns"] or "summary" in context:
+        payload["context"] = context
+
+    # What sending the whole history would cost, from the byte counts kept as
+    # messages are added rather than by serializing it all again
+    earlier_bytes = st.session_state.history_bytes - message_size(
+        st.session_state.messages[-1]
+    )
+    separators = 2 * max(len(earlier_messages) - 1, 0)
+    full_size = (
+        payload_size({"query_text": prompt, "context": {"recent_turns": []}})
+        + earlier_bytes
+        + separators
+    )
+    return payload, f"{payload_size(payload)} bytes (full history: {full_size} bytes)"
+
+
 def format_sources(sources):
     if not sources:
         return "No sources available."
@@ -71,10 +245,9 @@ def main():
 
     # Check authentication
     if LOGIN_ENABLED:
-        if (
-            "authenticated" not in st.session_state
-            or not st.session_state.authenticated
-        ):
+        # Tokens were verified when issued, so this is a local expiry check
+        # that only calls Cognito (in the background) when they need renewing
+        if not is_logged_in():
             st.warning("Please log in to access the chatbot.")
             st.markdown("[Go to Login Page](/)")
             st.stop()
@@ -93,60 +266,83 @@ def main():
     """
     )
 
-    # Initialize chat history, details, and feedback
+    # Initialize chat history, details, and feedback, resuming the newest
+    # page of a saved conversation if there is one
     if "messages" not in st.session_state:
         st.session_state.messages = []
-    if "details" not in st.session_state:
         st.session_state.details = {}
-    if "feedback" not in st.session_state:
         st.session_state.feedback = {}
+        st.session_state.has_earlier_history = False
+        st.session_state.history_bytes = 0
+        turns = load_history_page()
+        if turns is None:
+            # Numbering new turns from 0 would collide with the turns already
+            # saved under this id, so carry on in a new conversation instead
+            start_new_conversation()
+            st.warning(
+                "Your earlier conversation could not be loaded, so a new one "
+                "has been started."
+            )
+        else:
+            add_history_turns(turns)
+
+    # Page in older messages on demand
+    if st.session_state.has_earlier_history:
+        if st.button("Load earlier messages"):
+            turns = load_history_page(before=st.session_state.messages[0]["turn"])
+            if turns is None:
+                st.error("Earlier messages could not be loaded. Please try again.")
+            else:
+                add_history_turns(turns)
+                st.rerun()
 
     # Display chat messages from history on app rerun
-    for i, message in enumerate(st.session_state.messages):
+    for message in st.session_state.messages:
+        turn = message["turn"]
         with st.chat_message(message["role"]):
             st.markdown(message["content"], unsafe_allow_html=True)
 
             if message["role"] == "assistant":
-                details = st.session_state.details.get(i, {}).get(
+                details = st.session_state.details.get(turn, {}).get(
                     "additional_info", "No details available."
                 )
                 with st.expander("View Details", expanded=False):
                     st.markdown(details, unsafe_allow_html=True)
 
                 # Add feedback buttons
-                if i not in st.session_state.feedback:
+                if turn not in st.session_state.feedback:
                     st.write("Did you like this response?")
                     col1, col2 = st.columns(2)
                     with col1:
-                        if st.button("👍", key=f"thumbs_up_{i}"):
-                            query_id = st.session_state.details.get(i, {}).get(
+                        if st.button("👍", key=f"thumbs_up_{turn}"):
+                            query_id = st.session_state.details.get(turn, {}).get(
                                 "query_id", "N/A"
                             )
                             if update_feedback_in_dynamodb(query_id, True):
-                                st.session_state.feedback[i] = "positive"
+                                save_history_feedback(turn, "positive")
                                 st.success("Thank you for your positive feedback!")
                             else:
                                 # Quietly continue without error message
-                                st.session_state.feedback[i] = "positive"
+                                save_history_feedback(turn, "positive")
                                 st.success("Thank you for your positive feedback!")
                     with col2:
-                        if st.button("👎", key=f"thumbs_down_{i}"):
-                            query_id = st.session_state.details.get(i, {}).get(
+                        if st.button("👎", key=f"thumbs_down_{turn}"):
+                            query_id = st.session_state.details.get(turn, {}).get(
                                 "query_id", "N/A"
                             )
                             if update_feedback_in_dynamodb(query_id, False):
-                                st.session_state.feedback[i] = "negative"
+                                save_history_feedback(turn, "negative")
                                 st.error(
                                     "We're sorry to hear that. We'll work on improving."
                                 )
                             else:
                                 # Quietly continue without error message
-                                st.session_state.feedback[i] = "negative"
+                                save_history_feedback(turn, "negative")
                                 st.error(
                                     "We're sorry to hear that. We'll work on improving."
                                 )
                 else:
-                    if st.session_state.feedback[i] == "positive":
+                    if st.session_state.feedback[turn] == "positive":
                         st.success("You gave positive feedback for this response.")
                     else:
                         st.error("You gave negative feedback for this response.")
@@ -154,31 +350,41 @@ def main():
     # React to user input
     if prompt := st.chat_input("Ask a question about LEWAS Lab"):
         # Add user message to chat history
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        save_history_turn({"role": "user", "content": prompt})
         # Display user message
         with st.chat_message("user"):
             st.markdown(prompt)
 
         # Show loading spinner while waiting for response
         with st.spinner("Thinking..."):
+            payload, request_size = build_query_payload(prompt)
+            # Follow-ups depend on the conversation, so only standalone
+            # questions are looked up in the caches
+            cache_key = None if "context" in payload else question_key(prompt)
             try:
                 # First, classify the query using the smart_query endpoint
-                classification_response = requests.post(
-                    f"{API_BASE_URL}/classify_query",
-                    json={"query_text": prompt},
-                    headers={
-                        "accept": "application/json",
-                        "Content-Type": "application/json",
-                        "API-Key": API_KEY,
-                    },
-                    timeout=10,
-                )
+                classification = classification_cache.get(cache_key)
+                if classification is None:
+                    classification_response = post_query(
+                        f"{API_BASE_URL}/classify_query", payload, API_KEY, timeout=10
+                    )
 
-                if classification_response.status_code == 200:
-                    # Get the classification result
-                    classification_data = classification_response.json()
-                    classification = classification_data.get("classification", "RAG")
+                    if classification_response.status_code == 200:
+                        # Get the classification result
+                        try:
+                            classification_data = decode_response(
+                                classification_response
+                            )
+                        except ValueError:
+                            classification_data = {}
+                        if "classification" in classification_data:
+                            classification = classification_data["classification"]
+                            classification_cache.set(cache_key, classification)
+                        else:
+                            # Fall back to RAG for this question only
+                            classification = "RAG"
 
+                if classification is not None:
                     # Select appropriate API base URL, endpoint, and API key
                     if classification == "RAG":
                         # Use RAG endpoint on the RAG server with RAG-specific API key
@@ -191,67 +397,84 @@ def main():
                         endpoint = "/smart_query"
                         api_key = API_KEY  # Use standard API key
 
-                    # Now make the actual query with the appropriate endpoint and API key
-                    response = requests.post(
-                        f"{base_url}{endpoint}",
-                        json={"query_text": prompt},
-                        headers={
-                            "accept": "application/json",
-                            "Content-Type": "application/json",
-                            "API-Key": api_key,  # Use the selected API key
-                        },
-                        timeout=30,
-                    )
+                    # Knowledge base answers can be reused; live data and
+                    # visualizations are always fetched
+                    response_json = None
+                    cached_answer = None
+                    if classification == "RAG":
+                        cached_answer = answer_cache.get(cache_key)
+                    if cached_answer is not None:
+                        response_json = log_cached_answer(
+                            prompt, classification, cached_answer
+                        )
 
-                    if response.status_code == 200:
-                        try:
-                            response_json = response.json()
-                        except json.JSONDecodeError:
+                    if response_json is None:
+                        # Now make the actual query with the appropriate endpoint and API key
+                        response = post_query(
+                            f"{base_url}{endpoint}",
+                            payload,
+                            api_key,  # Use the selected API key
+                            timeout=30,
+                        )
+
+                        if response.status_code == 200:
+                            try:
+                                response_json = decode_response(response)
+                            except ValueError:
+                                assistant_response = (
+                                    "Error: Unable to parse the server response."
+                                )
+                                additional_info = "No details available."
+                                query_id = "N/A"
+                            else:
+                                if classification == "RAG":
+                                    answer_cache.set(cache_key, response_json)
+                        else:
                             assistant_response = (
-                                "Error: Unable to parse the server response."
+                                f"Error: Received status code {response.status_code}"
                             )
                             additional_info = "No details available."
                             query_id = "N/A"
-                        else:
-                            assistant_response = response_json.get(
-                                "answer_text", "Sorry, I couldn't process that request."
-                            )
-                            query_id = response_json.get("query_id", "N/A")
-                            create_time = datetime.fromtimestamp(
-                                response_json.get("create_time", 0)
-                            ).strftime("%Y-%m-%d %H:%M:%S")
-                            sources = response_json.get("sources", [])
 
-                            additional_info = f"""
-                            <p><strong>Query ID:</strong> {query_id}</p>
-                            <p><strong>Time:</strong> {create_time}</p>
-                            <p><strong>Query Type:</strong> {classification}</p>
-                            <p><strong>Sources:</strong></p>
-                            {format_sources(sources)}
-                            """
-                    else:
-                        assistant_response = (
-                            f"Error: Received status code {response.status_code}"
+                    if response_json is not None:
+                        assistant_response = response_json.get(
+                            "answer_text", "Sorry, I couldn't process that request."
                         )
-                        additional_info = "No details available."
-                        query_id = "N/A"
+                        query_id = response_json.get("query_id", "N/A")
+                        create_time = datetime.fromtimestamp(
+                            response_json.get("create_time", 0)
+                        ).strftime("%Y-%m-%d %H:%M:%S")
+                        sources = response_json.get("sources", [])
+                        if cached_answer is not None:
+                            answered_time = datetime.fromtimestamp(
+                                cached_answer.get("create_time", 0)
+                            ).strftime("%Y-%m-%d %H:%M:%S")
+                            served_from = (
+                                f"cache (answered {answered_time}, "
+                                f"query ID {cached_answer.get('query_id', 'N/A')})"
+                            )
+                        else:
+                            served_from = "backend"
+
+                        additional_info = f"""
+                        <p><strong>Query ID:</strong> {query_id}</p>
+                        <p><strong>Time:</strong> {create_time}</p>
+                        <p><strong>Query Type:</strong> {classification}</p>
+                        <p><strong>Served From:</strong> {served_from}</p>
+                        <p><strong>Request Size:</strong> {request_size}</p>
+                        <p><strong>Sources:</strong></p>
+                        {format_sources(sources)}
+                        """
                 else:
                     # If classification fails, default to using the smart_query endpoint with standard API key
-                    response = requests.post(
-                        f"{API_BASE_URL}/smart_query",
-                        json={"query_text": prompt},
-                        headers={
-                            "accept": "application/json",
-                            "Content-Type": "application/json",
-                            "API-Key": API_KEY,
-                        },
-                        timeout=30,
+                    response = post_query(
+                        f"{API_BASE_URL}/smart_query", payload, API_KEY, timeout=30
                     )
 
                     if response.status_code == 200:
                         try:
-                            response_json = response.json()
-                        except json.JSONDecodeError:
+                            response_json = decode_response(response)
+                        except ValueError:
                             assistant_response = (
                                 "Error: Unable to parse the server response."
                             )
@@ -270,6 +493,7 @@ def main():
                             additional_info = f"""
                             <p><strong>Query ID:</strong> {query_id}</p>
                             <p><strong>Time:</strong> {create_time}</p>
+                            <p><strong>Request Size:</strong> {request_size}</p>
                             <p><strong>Sources:</strong></p>
                             {format_sources(sources)}
                             """
@@ -285,16 +509,15 @@ def main():
                 additional_info = "No details available."
                 query_id = "N/A"
 
-        # Add assistant response to chat history
-        st.session_state.messages.append(
-            {"role": "assistant", "content": assistant_response}
-        )
-
-        # Store details
-        st.session_state.details[len(st.session_state.messages) - 1] = {
+        # Add assistant response and its details to chat history
+        details = {
             "additional_info": additional_info,
             "query_id": query_id,
         }
+        turn = save_history_turn(
+            {"role": "assistant", "content": assistant_response}, details=details
+        )
+        st.session_state.details[turn] = details
 
         # Rerun to update the chat history
         st.rerun()
@@ -390,18 +613,16 @@ def main():
     """
     )
 
-    # Add a clear button for chat history
+    # Add a clear button for chat history (saved history is kept, clearing
+    # starts a new conversation)
     if st.sidebar.button("Clear Chat History"):
-        st.session_state.messages = []
-        st.session_state.details = {}
-        st.session_state.feedback = {}
+        start_new_conversation()
         st.rerun()
 
     # Add a logout button
     if LOGIN_ENABLED:
         if st.sidebar.button("Logout"):
-            st.session_state.authenticated = False
-            st.query_params.clear()
+            log_out()
             st.rerun()
     else:
         st.sidebar.info("Login is currently disabled.")
@@ -416,4 +637,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    with rerun_profile:
+        main()
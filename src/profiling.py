@@ -0,0 +1,250 @@
+import atexit
+import contextlib
+import heapq
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+import streamlit as st
+
+# Opt-in profiling of Streamlit reruns. Set PROFILING_ENABLED = true in
+# secrets.toml to profile every rerun, or set PROFILING_TOKEN and open a page
+# with ?profile=<token> to profile only that session.
+DEFAULT_PROFILING_DIR = "profiles"
+DEFAULT_INTERVAL_MS = 5
+# Number of slowest reruns kept for the report
+TOP_N = 20
+# Minimum seconds between writing the output files
+FLUSH_INTERVAL = 10
+
+_DISABLED = contextlib.nullcontext()
+
+
+class ProfileCollector:
+    # Aggregates the samples of all profiled reruns in this server process and
+    # writes them out as collapsed stacks (for flamegraph.pl or speedscope), a
+    # speedscope profile and a report of the slowest reruns
+    def __init__(self, output_dir, interval_ms, top_n=TOP_N):
+        self.output_dir = output_dir
+        self.interval_ms = interval_ms
+        self.top_n = top_n
+        self._lock = threading.Lock()
+        self._stacks = defaultdict(Counter)
+        self._reruns = Counter()
+        self._total_ms = Counter()
+        self._slowest = []
+        self._sequence = itertools.count()
+        self._flushed_at = 0.0
+        self._dirty = False
+        atexit.register(self.flush)
+
+    def record(self, page, duration_ms, samples):
+        hot = Counter()
+        for stack, count in samples.items():
+            hot[stack[-1]] += count
+        record = {
+            "page": page,
+            "duration_ms": duration_ms,
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "hot": hot.most_common(3),
+            "samples": sum(samples.values()),
+        }
+
+        with self._lock:
+            self._stacks[page].update(samples)
+            self._reruns[page] += 1
+            self._total_ms[page] += duration_ms
+            entry = (duration_ms, next(self._sequence), record)
+            if len(self._slowest) < self.top_n:
+                heapq.heappush(self._slowest, entry)
+            else:
+                heapq.heappushpop(self._slowest, entry)
+            self._dirty = True
+            due = time.monotonic() - self._flushed_at > FLUSH_INTERVAL
+
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            stacks = {page: Counter(counts) for page, counts in self._stacks.items()}
+            reruns = Counter(self._reruns)
+            total_ms = Counter(self._total_ms)
+            slowest = sorted(self._slowest, reverse=True)
+            self._dirty = False
+            self._flushed_at = time.monotonic()
+
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            for page, counts in stacks.items():
+                self._write_folded(page, counts)
+            self._write_speedscope(stacks)
+            self._write_report(reruns, total_ms, slowest)
+        except OSError as e:
+            print(f"Profile write error: {str(e)}")
+
+    def _path(self, name):
+        return os.path.join(self.output_dir, name)
+
+    def _write_folded(self, page, counts):
+        with open(self._path(f"{page}.folded"), "w") as f:
+            for stack, count in counts.most_common():
+                f.write(";".join(format_frame(frame) for frame in stack))
+                f.write(f" {count}\n")
+
+    def _write_speedscope(self, stacks):
+        frames = []
+        frame_index = {}
+        profiles = []
+        for page, counts in stacks.items():
+            samples = []
+            weights = []
+            for stack, count in counts.items():
+                indices = []
+                for frame in stack:
+                    if frame not in frame_index:
+                        frame_index[frame] = len(frames)
+                        name, filename, line = frame
+                        frames.append({"name": name, "file": filename, "line": line})
+                    indices.append(frame_index[frame])
+                samples.append(indices)
+                weights.append(count * self.interval_ms)
+            profiles.append(
+                {
+                    "type": "sampled",
+                    "name": page,
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            )
+
+        with open(self._path("profile.speedscope.json"), "w") as f:
+            json.dump(
+                {
+                    "$schema": "https://www.speedscope.app/file-format-schema.json",
+                    "name": "LEWAS Lab Chatbot reruns",
+                    "shared": {"frames": frames},
+                    "profiles": profiles,
+                },
+                f,
+            )
+
+    def _write_report(self, reruns, total_ms, slowest):
+        with open(self._path("slowest_reruns.txt"), "w") as f:
+            f.write("Reruns per page\n")
+            for page, count in reruns.most_common():
+                f.write(
+                    f"  {page}: {count} reruns, "
+                    f"{total_ms[page] / count:.1f} ms average\n"
+                )
+
+            f.write(f"\nTop {len(slowest)} slowest reruns\n")
+            for rank, (duration_ms, _, record) in enumerate(slowest, start=1):
+                f.write(
+                    f"{rank:>3}. {duration_ms:8.1f} ms  {record['page']}  "
+                    f"{record['time']}\n"
+                )
+                for frame, count in record["hot"]:
+                    share = count / record["samples"]
+                    f.write(f"       {share:4.0%}  {format_frame(frame)}\n")
+
+
+class RerunProfile:
+    # Samples the stack of the script thread from a background thread for the
+    # duration of one rerun
+    def __init__(self, collector, page, interval_ms, root_frame):
+        self.collector = collector
+        self.page = page
+        self.interval = interval_ms / 1000
+        self.root_code = root_frame.f_code
+        self.thread_id = threading.get_ident()
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = self._stack(frame)
+            if stack is None or self._stop.is_set():
+                # The rerun is over (or the script ended without reaching
+                # __exit__)
+                break
+            self.samples[stack] += 1
+
+    def _stack(self, frame):
+        # Walk up to the page script itself, leaving out Streamlit's runner
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+            if code is self.root_code:
+                stack.reverse()
+                return tuple(stack)
+            frame = frame.f_back
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        # st.rerun() and st.stop() end a run with an exception, so this runs
+        # for those too
+        self._stop.set()
+        self._thread.join()
+        duration_ms = (time.perf_counter() - self._started_at) * 1000
+        self.collector.record(self.page, duration_ms, self.samples)
+        return False
+
+
+def format_frame(frame):
+    name, filename, line = frame
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+@st.cache_resource
+def get_collector():
+    return ProfileCollector(
+        st.secrets.get("PROFILING_DIR", DEFAULT_PROFILING_DIR),
+        st.secrets.get("PROFILING_INTERVAL_MS", DEFAULT_INTERVAL_MS),
+    )
+
+
+def profiling_enabled():
+    if st.secrets.get("PROFILING_ENABLED", False):
+        return True
+    if st.session_state.get("profiling_enabled"):
+        return True
+    token = st.secrets.get("PROFILING_TOKEN")
+    if token and st.query_params.get("profile") == token:
+        # Remembered for the session, since st.switch_page and page links drop
+        # the query parameters
+        st.session_state.profiling_enabled = True
+        return True
+    return False
+
+
+def start(page):
+    # Call at the top of a page script and use the result as a context manager
+    # around the page's main(). Sampling begins here so the page's module-level
+    # setup is included. When profiling is off this returns a shared no-op.
+    if not profiling_enabled():
+        return _DISABLED
+    return RerunProfile(
+        get_collector(),
+        page,
+        st.secrets.get("PROFILING_INTERVAL_MS", DEFAULT_INTERVAL_MS),
+        sys._getframe(1),
+    )
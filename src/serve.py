@@ -0,0 +1,19 @@
+import os
+import sys
+
+from streamlit.web import cli as stcli
+
+import warmup
+
+# Starts the app with its warm start running from process boot rather than
+# from the first session:
+#
+#     python src/serve.py [streamlit run options]
+#
+# The warm start lives in this process, so the pages share its connections
+# and caches.
+if __name__ == "__main__":
+    warmup.start()
+    main_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    sys.argv = ["streamlit", "run", main_script] + sys.argv[1:]
+    sys.exit(stcli.main())
@@ -0,0 +1,163 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import boto3
+import streamlit as st
+from botocore.config import Config
+
+from api import session
+from caches import answer_cache, classification_cache, question_key
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+# Static files read by the pages, relative to src/
+ASSETS = ["images/lewas_logo.png"]
+DEFAULT_TOP_QUESTIONS_PATH = os.path.join("analytics", "top_questions.json")
+
+_assets = {}
+_assets_lock = threading.Lock()
+_dynamodb = None
+_dynamodb_lock = threading.Lock()
+_warm_start = None
+_warm_start_lock = threading.Lock()
+
+
+def get_asset(name):
+    # Contents of a static file, read from disk only once per process
+    with _assets_lock:
+        if name not in _assets:
+            with open(os.path.join(SRC_DIR, name), "rb") as f:
+                _assets[name] = f.read()
+        return _assets[name]
+
+
+def get_dynamodb():
+    # One low-level DynamoDB client (and connection pool) per process instead
+    # of a new resource on every rerun. Unlike resources, clients are
+    # thread-safe, so every session thread can share this one.
+    global _dynamodb
+    with _dynamodb_lock:
+        if _dynamodb is None:
+            _dynamodb = boto3.client(
+                "dynamodb",
+                aws_access_key_id=st.secrets["AWS_ACCESS_KEY_ID"],
+                aws_secret_access_key=st.secrets["AWS_SECRET_ACCESS_KEY"],
+                region_name=st.secrets["AWS_REGION_NAME"],
+                # Fail fast rather than hang the page (or the warm start)
+                config=Config(
+                    connect_timeout=5, read_timeout=10, retries={"max_attempts": 2}
+                ),
+            )
+        return _dynamodb
+
+
+def load_assets():
+    return {name: len(get_asset(name)) for name in ASSETS}
+
+
+def preconnect_backends():
+    # Any response will do; this opens the TLS connections in the shared pool
+    statuses = {}
+    for name in ["API_BASE_URL", "API_BASE_URL_RAG"]:
+        response = session.head(st.secrets[name], timeout=5)
+        statuses[name] = response.status_code
+    return statuses
+
+
+def preconnect_dynamodb():
+    get_dynamodb().describe_endpoints()
+    return "connected"
+
+
+def prefill_from_top_questions():
+    # Seed the caches from the most asked questions found by analytics.py
+    path = st.secrets.get("TOP_QUESTIONS_PATH", DEFAULT_TOP_QUESTIONS_PATH)
+    if not os.path.exists(path):
+        return f"{path} not found"
+
+    with open(path) as f:
+        questions = json.load(f)
+    for question in questions:
+        key = question_key(question["query_text"])
+        if question.get("classification"):
+            classification_cache.set(key, question["classification"])
+        if question.get("answer_text"):
+            answer_cache.set(
+                key,
+                {
+                    "answer_text": question["answer_text"],
+                    "query_id": question.get("query_id", "N/A"),
+                    "create_time": question.get("create_time", 0),
+                    "sources": question.get("sources") or [],
+                },
+            )
+    return f"{len(questions)} questions"
+
+
+class WarmStart:
+    # Runs every warm-up step once, recording how each went. A failed step is
+    # logged and skipped: the replica still becomes ready and that cost is paid
+    # by the first request that needs it instead.
+    def __init__(self):
+        self.steps = {}
+        self.ready = threading.Event()
+        self.started_at = time.time()
+
+    def _step(self, name, func):
+        started = time.perf_counter()
+        try:
+            self.steps[name] = {"status": "ok", "detail": func()}
+        except Exception as e:
+            print(f"Warm start {name} error: {str(e)}")
+            self.steps[name] = {"status": "error", "detail": str(e)}
+        self.steps[name]["seconds"] = round(time.perf_counter() - started, 3)
+
+    def run(self):
+        self._step("assets", load_assets)
+        self._step("backends", preconnect_backends)
+        self._step("dynamodb", preconnect_dynamodb)
+        self._step("top_questions", prefill_from_top_questions)
+        self.ready.set()
+
+    def status(self):
+        return {
+            "ready": self.ready.is_set(),
+            "uptime_seconds": round(time.time() - self.started_at),
+            "steps": dict(self.steps),
+            "cached_classifications": len(classification_cache),
+            "cached_answers": len(answer_cache),
+        }
+
+
+class ReadinessHandler(BaseHTTPRequestHandler):
+    # 200 once the warm start has finished, 503 before that
+    def do_GET(self):
+        status = _warm_start.status()
+        body = json.dumps(status).encode("utf-8")
+        self.send_response(200 if status["ready"] else 503)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep load balancer probes out of the logs
+        pass
+
+
+def start():
+    # Starts the warm start in the background the first time it is called in
+    # this process and returns it. Set READINESS_PORT to also serve its status
+    # over HTTP for the load balancer's health check.
+    global _warm_start
+    with _warm_start_lock:
+        if _warm_start is None:
+            _warm_start = WarmStart()
+            port = st.secrets.get("READINESS_PORT")
+            if port:
+                server = ThreadingHTTPServer(("0.0.0.0", int(port)), ReadinessHandler)
+                threading.Thread(target=server.serve_forever, daemon=True).start()
+            threading.Thread(target=_warm_start.run, daemon=True).start()
+        return _warm_start